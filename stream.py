@@ -1,13 +1,26 @@
 import streamlit as st
 from crewai import Crew, Task, Agent, LLM
+from crewai.tools import BaseTool
 from crewai_tools import SerperDevTool, SeleniumScrapingTool
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+from sqlalchemy import text
+from selectolax.parser import HTMLParser
+import httpx
+import litellm
 import os
+import asyncio
+import functools
 import time
 import json
+import io
+import math
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import pandas as pd
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Iterator, Type
 
 # Load environment variables
 load_dotenv()
@@ -20,75 +33,150 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better styling
-st.markdown("""
-<style>
-    .main-header {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        color: white;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    
-    .metric-card {
-        background: #f0f2f6;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #667eea;
-        margin: 0.5rem 0;
-    }
-    
-    .success-box {
-        background: #d4edda;
-        border: 1px solid #c3e6cb;
-        border-radius: 8px;
-        padding: 1rem;
-        color: #155724;
-    }
-    
-    .warning-box {
-        background: #fff3cd;
-        border: 1px solid #ffeaa7;
-        border-radius: 8px;
-        padding: 1rem;
-        color: #856404;
-    }
-    
-    .error-box {
-        background: #f8d7da;
-        border: 1px solid #f5c6cb;
-        border-radius: 8px;
-        padding: 1rem;
-        color: #721c24;
-    }
-    
-    .stButton > button {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.75rem 2rem;
-        font-weight: 600;
-        transition: all 0.3s ease;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(102, 126, 234, 0.4);
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for better styling, read once per version of style.css
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "style.css")
+
+@st.cache_data(show_spinner=False)
+def load_css(path: str, mtime: float) -> str:
+    """Load the stylesheet as a <style> block, cached on the file's mtime"""
+    with open(path, "r", encoding='utf-8') as f:
+        return f"<style>\n{f.read()}</style>"
+
+st.markdown(load_css(CSS_PATH, os.path.getmtime(CSS_PATH)), unsafe_allow_html=True)
+
+# Research sub-topics, batched into one prompt or run as independent async tasks
+RESEARCH_TOPICS = {
+    'overview': ("Company Overview", "size, revenue, business model, key products/services"),
+    'industry': ("Industry Analysis", "market trends, competitive landscape, regulatory environment"),
+    'tech_stack': ("Technology Stack", "current technology usage, digital maturity level"),
+    'developments': ("Recent Developments", "latest news, partnerships, investments, strategic initiatives, expansion plans and new market opportunities"),
+    'pain_points': ("Pain Points", "known challenges or inefficiencies in their operations"),
+}
+
+# Serper requests in flight at once, across every tool, session and bulk run
+SERPER_MAX_CONCURRENCY = 5
+
+@st.cache_resource
+def get_serper_limiter() -> threading.BoundedSemaphore:
+    """Process-wide limit on concurrent Serper requests, to stay inside its rate limits"""
+    return threading.BoundedSemaphore(SERPER_MAX_CONCURRENCY)
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def _cached_serper(_tool: SerperDevTool, query: str, n_results: int, search_type: str) -> Any:
+    """Run a Serper search, memoized on the query parameters (never the API key)"""
+    with get_serper_limiter():
+        return SerperDevTool._run(_tool, search_query=query)
+
+class CachedSerperTool(SerperDevTool):
+    """SerperDevTool that serves repeated queries from the Streamlit cache"""
+
+    def _run(self, **kwargs: Any) -> Any:
+        query = kwargs.get('search_query') or kwargs.get('query')
+        return _cached_serper(self, query, self.n_results, getattr(self, 'search_type', 'search'))
+
+# Export tab download buttons: (output key, label, file name suffix)
+EXPORTS = [
+    ('proposal', "📄 Download Full Proposal", "AI_ML_Proposal"),
+    ('research', "🔍 Download Research", "Research"),
+    ('analysis', "📊 Download Analysis", "Analysis"),
+]
+
+# Companies kicked off at once when bulk-processing an uploaded CSV
+BULK_CONCURRENCY = 5
+
+# SQLite database holding the analysis history, next to this script regardless of the working directory
+HISTORY_DB_URL = "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.db")
+
+# Max-tokens default; the analyst's own cap defaults lower when its recent answers ran far shorter
+DEFAULT_MAX_TOKENS = 5000
+ANALYST_TOKEN_THRESHOLD = 2500
+
+# LLM temperatures for the crews raced under speculative execution
+SPECULATIVE_TEMPERATURES = [0.3, 0.7]
+
+# Gemini models: the analyst's structured enumeration runs on the lighter 8B model
+LLM_MODEL = "gemini/gemini-1.5-flash"
+ANALYST_LLM_MODEL = "gemini/gemini-1.5-flash-8b"
+
+class AsyncHttpScrapingInput(BaseModel):
+    """Input schema for AsyncHttpScrapingTool"""
+    urls: list[str] = Field(..., description="List of web page URLs to fetch and read")
+
+class AsyncHttpScrapingTool(BaseTool):
+    """Fetch pages concurrently over HTTP, using the browser only for JS-rendered pages"""
+    name: str = "Read website content"
+    description: str = "Fetch one or more web pages concurrently and return their visible text content."
+    args_schema: Type[BaseModel] = AsyncHttpScrapingInput
+    fallback_factory: Optional[Callable[[], BaseTool]] = None
+    max_chars_per_page: int = 8000
+
+    def _run(self, urls: list[str]) -> str:
+        pages = asyncio.run(self._fetch_all(urls))
+        results = []
+        for url, text in pages:
+            if text is None and self.fallback_factory is not None:
+                text = str(self.fallback_factory().run(website_url=url))
+            results.append(f"### {url}\n{(text or 'No readable content found.')[:self.max_chars_per_page]}")
+        return "\n\n".join(results)
+
+    async def _fetch_all(self, urls: list[str]) -> list[tuple[str, Optional[str]]]:
+        limits = httpx.Limits(max_connections=32)
+        headers = {"User-Agent": "Mozilla/5.0 (compatible; UseCaseAgent/1.0)"}
+        async with httpx.AsyncClient(http2=True, limits=limits, headers=headers, follow_redirects=True) as client:
+            return await asyncio.gather(*[self._fetch(client, url) for url in urls])
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str) -> tuple[str, Optional[str]]:
+        try:
+            response = await client.get(url, timeout=10)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            return url, f"Failed to fetch page: {e}"
+        return url, self._extract_text(response.text)
+
+    @staticmethod
+    def _extract_text(html: str) -> Optional[str]:
+        """Return visible body text, or None when the page needs JS rendering"""
+        tree = HTMLParser(html)
+        if tree.body is None:
+            return None
+        noscript_text = " ".join(node.text(separator=' ') for node in tree.css('noscript'))
+        tree.strip_tags(['script', 'style', 'noscript'])
+        text = " ".join(tree.body.text(separator=' ').split())
+        if not text or len(noscript_text.strip()) > len(text):
+            return None
+        return text
+
+class ParallelSearchInput(BaseModel):
+    """Input schema for ParallelSerperTool"""
+    search_queries: list[str] = Field(..., description="List of independent search queries to run at once")
+
+class ParallelSerperTool(BaseTool):
+    """Run several Serper queries concurrently in one tool call"""
+    name: str = "Search the internet (batch)"
+    description: str = "Run several independent internet searches at once and return the results for each query."
+    args_schema: Type[BaseModel] = ParallelSearchInput
+    search_tool: SerperDevTool
+
+    def _run(self, search_queries: list[str]) -> str:
+        results = asyncio.run(self._arun(search_queries))
+        return "\n\n".join(f"### {query}\n{result}" for query, result in zip(search_queries, results))
+
+    async def _arun(self, search_queries: list[str]) -> list[Any]:
+        # Network concurrency is bounded by the shared Serper limiter inside the cached search
+        return await asyncio.gather(*[
+            asyncio.to_thread(self.search_tool.run, search_query=query) for query in search_queries
+        ])
 
 def initialize_session_state():
     """Initialize session state variables"""
-    if 'analysis_history' not in st.session_state:
-        st.session_state.analysis_history = []
     if 'current_analysis' not in st.session_state:
         st.session_state.current_analysis = None
     if 'api_keys_valid' not in st.session_state:
         st.session_state.api_keys_valid = None
+    if 'pending_run' not in st.session_state:
+        st.session_state.pending_run = None
+    if 'outputs' not in st.session_state:
+        st.session_state.outputs = None
 
 def validate_api_keys() -> tuple[bool, list]:
     """Validate required API keys"""
@@ -101,37 +189,173 @@ def validate_api_keys() -> tuple[bool, list]:
     
     return len(missing_keys) == 0, missing_keys
 
-def save_analysis_to_history(company_name: str, result: str, duration: float):
-    """Save analysis results to session history"""
-    analysis_data = {
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'company': company_name,
-        'duration': round(duration, 2),
-        'result': result,
-        'id': len(st.session_state.analysis_history)
-    }
-    st.session_state.analysis_history.append(analysis_data)
+def get_history_connection():
+    """SQLite connection backing the analysis history"""
+    return st.connection('history', type='sql', url=HISTORY_DB_URL)
+
+@st.cache_resource
+def init_history_db() -> Dict[str, int]:
+    """Create the history tables once and return the shared write-version counter"""
+    with get_history_connection().session as session:
+        session.execute(text("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT,
+                ts TEXT NOT NULL,
+                company TEXT NOT NULL,
+                duration REAL NOT NULL,
+                tokens TEXT,
+                result TEXT NOT NULL
+            )
+        """))
+        # One row per crew raced under speculative execution, joined to analyses on run_id
+        session.execute(text("""
+            CREATE TABLE IF NOT EXISTS crew_runs (
+                run_id TEXT NOT NULL,
+                label TEXT NOT NULL,
+                duration REAL NOT NULL
+            )
+        """))
+        session.commit()
+    return {'version': 0}
+
+def save_analysis_to_history(company_name: str, result: str, duration: float, run_id: Optional[str] = None, tokens: Optional[Dict[str, Any]] = None):
+    """Save analysis results to the history database"""
+    history_state = init_history_db()
+    with get_history_connection().session as session:
+        session.execute(
+            text("""
+                INSERT INTO analyses (run_id, ts, company, duration, tokens, result)
+                VALUES (:run_id, :ts, :company, :duration, :tokens, :result)
+            """),
+            {
+                'run_id': run_id,
+                'ts': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'company': company_name,
+                'duration': round(duration, 2),
+                'tokens': json.dumps(tokens) if tokens else None,
+                'result': result,
+            }
+        )
+        session.commit()
+    # Bump the version so cached history reads pick up the new row
+    history_state['version'] += 1
+
+def record_crew_duration(run_id: str, labels: list[str], index: int, duration: float):
+    """Save one raced crew's duration; the losing crew reports in after its analysis row is written"""
+    init_history_db()
+    with get_history_connection().session as session:
+        session.execute(
+            text("INSERT INTO crew_runs (run_id, label, duration) VALUES (:run_id, :label, :duration)"),
+            {'run_id': run_id, 'label': labels[index], 'duration': duration}
+        )
+        session.commit()
 
-def create_agents_and_tasks(company_name: str, llm: LLM, tool: SerperDevTool, tool_kag: SeleniumScrapingTool):
+@st.cache_data(ttl=10, show_spinner=False)
+def load_history_stats(version: int) -> tuple[int, float]:
+    """Return the analysis count and average duration"""
+    with get_history_connection().session as session:
+        total, avg_duration = session.execute(text("SELECT COUNT(*), AVG(duration) FROM analyses")).one()
+    return total, avg_duration or 0.0
+
+@st.cache_data(ttl=10, show_spinner=False)
+def load_recent_analyses(version: int, limit: int = 5) -> list[Dict[str, Any]]:
+    """Return the most recent analyses, newest first"""
+    with get_history_connection().session as session:
+        rows = session.execute(
+            text("SELECT id, ts, company, duration, tokens, result FROM analyses ORDER BY id DESC LIMIT :limit"),
+            {'limit': limit}
+        ).mappings().all()
+    return [
+        {
+            'id': row['id'],
+            'timestamp': row['ts'],
+            'company': row['company'],
+            'duration': row['duration'],
+            'tokens': json.loads(row['tokens']) if row['tokens'] else None,
+            'result': row['result'],
+        }
+        for row in rows
+    ]
+
+@st.cache_data(ttl=10, show_spinner=False)
+def load_duration_history(version: int) -> pd.DataFrame:
+    """Return every analysis timestamp and duration for charting"""
+    with get_history_connection().session as session:
+        rows = session.execute(text("SELECT ts, duration FROM analyses ORDER BY id")).all()
+    return pd.DataFrame(rows, columns=['timestamp', 'duration'])
+
+@st.cache_data(ttl=10, show_spinner=False)
+def load_token_history(version: int) -> pd.DataFrame:
+    """Return total prompt and completion tokens per analysis for charting"""
+    with get_history_connection().session as session:
+        rows = session.execute(text("SELECT ts, tokens FROM analyses WHERE tokens IS NOT NULL ORDER BY id")).all()
+    records = []
+    for ts, tokens in rows:
+        usage = json.loads(tokens)
+        stages = [usage['crew'], usage['proposal']]
+        records.append({
+            'timestamp': ts,
+            'prompt_tokens': sum(stage.get('prompt', 0) for stage in stages),
+            'completion_tokens': sum(stage.get('completion', 0) for stage in stages),
+        })
+    return pd.DataFrame(records, columns=['timestamp', 'prompt_tokens', 'completion_tokens'])
+
+def suggest_max_tokens(recent_analyses: list[Dict[str, Any]]) -> int:
+    """Lower the analyst's max-tokens default when its recent answers finish well under the threshold"""
+    completions = [a['tokens']['analysis_output'] for a in recent_analyses if a.get('tokens')]
+    if not completions:
+        return DEFAULT_MAX_TOKENS
+    avg_completion = sum(completions) / len(completions)
+    if avg_completion >= ANALYST_TOKEN_THRESHOLD:
+        return DEFAULT_MAX_TOKENS
+    # Leave 50% headroom, rounded up to the slider's 500-token step
+    return max(1000, math.ceil(avg_completion * 1.5 / 500) * 500)
+
+def create_agents_and_tasks(company_name: str, llm: LLM, tool: SerperDevTool, tool_kag: AsyncHttpScrapingTool, batch_research: bool = True, analyst_llm: Optional[LLM] = None, parallel_tool: Optional[ParallelSerperTool] = None):
     """Create and configure agents and tasks"""
     
-    # Enhanced agent definitions with more specific roles
-    researcher_agent = Agent(
-        llm=llm,
-        role="Senior Market Research Analyst",
-        goal=f"Conduct comprehensive research on {company_name} including industry analysis, competitive landscape, business model, recent developments, and strategic initiatives.",
-        backstory="""You are a seasoned market research analyst with 15+ years of experience in technology and business intelligence. 
+    # Researchers get the batch search tool when parallel tool calls are allowed
+    research_tools = [parallel_tool or tool, tool_kag]
+    
+    researcher_backstory = """You are a seasoned market research analyst with 15+ years of experience in technology and business intelligence. 
         You excel at gathering comprehensive information about companies, understanding their market position, 
-        identifying growth opportunities, and analyzing industry trends that could impact AI/ML adoption.""",
-        tools=[tool, tool_kag],
-        memory=True,
-        verbose=1,
-        max_iter=3,
-        max_execution_time=300
-    )
+        identifying growth opportunities, and analyzing industry trends that could impact AI/ML adoption."""
+
+    if batch_research:
+        # A single researcher answers every sub-query in one batched prompt
+        researcher_agents = [
+            Agent(
+                llm=llm,
+                role="Senior Market Research Analyst",
+                goal=f"Conduct comprehensive research on {company_name} including industry analysis, competitive landscape, business model, recent developments, and strategic initiatives.",
+                backstory=researcher_backstory,
+                tools=research_tools,
+                memory=True,
+                verbose=1,
+                max_iter=3,
+                max_execution_time=300
+            )
+        ]
+    else:
+        # One researcher per sub-topic so the async research tasks never share agent state
+        researcher_agents = [
+            Agent(
+                llm=llm,
+                role=f"Senior Market Research Analyst ({title})",
+                goal=f"Research the {title.lower()} of {company_name}: {focus}.",
+                backstory=researcher_backstory,
+                tools=research_tools,
+                memory=True,
+                verbose=1,
+                max_iter=3,
+                max_execution_time=300
+            )
+            for title, focus in RESEARCH_TOPICS.values()
+        ]
 
     analyst_agent = Agent(
-        llm=llm,
+        llm=analyst_llm or llm,
         role="AI/ML Strategy Consultant",
         goal="Analyze research findings to identify high-impact, feasible AI/ML use cases tailored to the company's specific context, capabilities, and industry requirements.",
         backstory="""You are an expert AI/ML strategy consultant with deep knowledge of machine learning applications across industries. 
@@ -144,42 +368,41 @@ def create_agents_and_tasks(company_name: str, llm: LLM, tool: SerperDevTool, to
         max_execution_time=300
     )
 
-    proposal_agent = Agent(
-        llm=llm,
-        role="Technical Proposal Specialist",
-        goal="Create a comprehensive, actionable AI/ML implementation proposal with detailed recommendations, timelines, and success metrics.",
-        backstory="""You are a technical proposal specialist with expertise in AI/ML project planning and implementation. 
-        You excel at translating complex technical concepts into clear business proposals, 
-        including implementation roadmaps, resource requirements, and measurable success criteria.""",
-        tools=[tool],
-        memory=True,
-        verbose=1,
-        max_iter=3,
-        max_execution_time=300
-    )
-
-    # Enhanced task definitions
-    research_task = Task(
-        description=f"""Conduct comprehensive research on {company_name}. Your research should include:
+    if batch_research:
+        # Batching the sub-queries amortizes the shared system prompt over one LLM call
+        sub_queries = "\n        ".join(
+            f"{i}. {key} - {title}: {focus}"
+            for i, (key, (title, focus)) in enumerate(RESEARCH_TOPICS.items(), start=1)
+        )
+        research_tasks = [
+            Task(
+                description=f"""Answer the following {len(RESEARCH_TOPICS)} sub-queries about {company_name}:
         
-        1. Company Overview: Size, revenue, business model, key products/services
-        2. Industry Analysis: Market trends, competitive landscape, regulatory environment
-        3. Technology Stack: Current technology usage, digital maturity level
-        4. Recent Developments: Latest news, partnerships, investments, strategic initiatives
-        5. Pain Points: Known challenges or inefficiencies in their operations
-        6. Growth Areas: Expansion plans, new market opportunities
+        {sub_queries}
         
-        Provide detailed, actionable insights that will inform AI/ML use case identification.""",
-        agent=researcher_agent,
-        expected_output="""A comprehensive research report containing:
-        - Executive summary of the company
-        - Industry context and market position
-        - Current technology landscape
-        - Identified business challenges and opportunities
-        - Strategic priorities and growth areas
-        All findings should be well-sourced and include relevant statistics where available.""",
-        output_file="research_findings.md"
-    )
+        Provide detailed, actionable insights that will inform AI/ML use case identification.
+        Return strict JSON with keys {", ".join(RESEARCH_TOPICS)}.""",
+                agent=researcher_agents[0],
+                expected_output=f"""A single JSON object with exactly the keys {", ".join(RESEARCH_TOPICS)}.
+        Each value is a well-sourced markdown section including relevant statistics where available."""
+            )
+        ]
+    else:
+        # Independent research sub-tasks run concurrently; the analysis task joins on them
+        research_tasks = [
+            Task(
+                description=f"""Research the {title.lower()} of {company_name}.
+            
+            Focus on: {focus}.
+            
+            Provide detailed, actionable insights that will inform AI/ML use case identification.""",
+                agent=agent,
+                expected_output=f"""A concise, well-sourced {title.lower()} section for {company_name} 
+            including relevant statistics where available.""",
+                async_execution=True
+            )
+            for agent, (title, focus) in zip(researcher_agents, RESEARCH_TOPICS.values())
+        ]
 
     analysis_task = Task(
         description=f"""Based on the research findings, identify and analyze potential AI/ML use cases for {company_name}. For each use case:
@@ -194,18 +417,25 @@ def create_agents_and_tasks(company_name: str, llm: LLM, tool: SerperDevTool, to
         
         Prioritize use cases based on impact vs. complexity matrix.""",
         agent=analyst_agent,
+        context=research_tasks,
         expected_output="""A detailed analysis report containing:
         - 5-8 prioritized AI/ML use cases with comprehensive details
         - Impact vs. complexity assessment for each use case
         - Technical requirements and implementation considerations
         - Risk assessment and mitigation strategies
         - Resource and timeline estimates
-        - Success metrics and measurement framework""",
-        output_file="use_case_analysis.md"
+        - Success metrics and measurement framework"""
     )
 
-    proposal_task = Task(
-        description=f"""Create a professional AI/ML implementation proposal for {company_name} that includes:
+    return researcher_agents, analyst_agent, research_tasks, analysis_task
+
+def build_proposal_messages(company_name: str, research: str, analysis: str) -> list[Dict[str, str]]:
+    """Build the chat messages for the streamed proposal-writing step"""
+    system_prompt = """You are a technical proposal specialist with expertise in AI/ML project planning and implementation. 
+        You excel at translating complex technical concepts into clear business proposals, 
+        including implementation roadmaps, resource requirements, and measurable success criteria."""
+
+    user_prompt = f"""Create a professional AI/ML implementation proposal for {company_name} that includes:
         
         1. Executive Summary highlighting key recommendations
         2. Prioritized use case roadmap with 3 phases (Quick Wins, Medium-term, Long-term)
@@ -219,29 +449,271 @@ def create_agents_and_tasks(company_name: str, llm: LLM, tool: SerperDevTool, to
         4. Success measurement framework
         5. Next steps and recommendations
         
-        Format as a professional business proposal.""",
-        agent=proposal_agent,
-        expected_output="""A comprehensive, professional AI/ML implementation proposal including:
-        - Executive summary with key recommendations
-        - Detailed 3-phase implementation roadmap
-        - Technical specifications and architecture
-        - Resource requirements and budget estimates
-        - Timeline with key milestones
-        - Success metrics and KPI framework
-        - Risk assessment and mitigation plan
-        - Clear next steps and action items
+        Format as a professional business proposal in markdown, ready for presentation to C-level executives.
         
-        The proposal should be ready for presentation to C-level executives.""",
-        output_file="final_proposal.md"
+        # Research Findings
+        {research}
+        
+        # Use Case Analysis
+        {analysis}"""
+
+    return [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': user_prompt},
+    ]
+
+def stream_proposal(llm: LLM, company_name: str, research: str, analysis: str, usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """Stream the final proposal from Gemini token by token, recording token usage into `usage`"""
+    response = litellm.completion(
+        model=llm.model,
+        messages=build_proposal_messages(company_name, research, analysis),
+        max_tokens=llm.max_tokens,
+        temperature=llm.temperature,
+        api_key=os.getenv("GEMINI_API_KEY"),
+        stream=True,
+        stream_options={'include_usage': True}
     )
+    for chunk in response:
+        chunk_usage = getattr(chunk, 'usage', None)
+        if chunk_usage and usage is not None:
+            usage['prompt'] = chunk_usage.prompt_tokens
+            usage['completion'] = chunk_usage.completion_tokens
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def parse_research_json(raw: str) -> Optional[Dict[str, Any]]:
+    """Parse the batched research JSON, tolerating markdown code fences"""
+    text = raw.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+    try:
+        findings = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    return findings if isinstance(findings, dict) else None
+
+def combine_research_findings(raw_outputs: list[str]) -> str:
+    """Merge the raw research task outputs into a single markdown report"""
+    if len(raw_outputs) == 1:
+        findings = parse_research_json(raw_outputs[0])
+        if findings is None:
+            return raw_outputs[0]
+    else:
+        findings = dict(zip(RESEARCH_TOPICS, raw_outputs))
+
+    sections = []
+    for key, (title, _) in RESEARCH_TOPICS.items():
+        body = findings.get(key) or "_No findings returned._"
+        sections.append(f"## {title}\n\n{body}")
+    return "\n\n".join(sections)
+
+@st.cache_resource
+def get_llm(max_tokens: int, temperature: Optional[float] = None, verbose: bool = True, model: str = LLM_MODEL) -> LLM:
+    """Shared Gemini LLM per configuration, so its HTTP client stays warm across runs"""
+    return LLM(
+        model=model,
+        verbose=verbose,
+        google_api_key=os.getenv("GEMINI_API_KEY"),
+        max_tokens=max_tokens,
+        temperature=temperature
+    )
+
+@st.cache_resource
+def get_serper() -> CachedSerperTool:
+    """Shared Serper search tool"""
+    return CachedSerperTool()
+
+@st.cache_resource
+def get_selenium() -> SeleniumScrapingTool:
+    """Shared Selenium scraping tool, used only as a fallback for JS-rendered pages"""
+    return SeleniumScrapingTool()
+
+@st.cache_resource
+def get_scraper() -> AsyncHttpScrapingTool:
+    """Shared async HTTP scraping tool"""
+    return AsyncHttpScrapingTool(fallback_factory=get_selenium)
+
+@st.cache_resource
+def get_parallel_serper() -> ParallelSerperTool:
+    """Shared batch search tool wrapping the cached Serper tool"""
+    return ParallelSerperTool(search_tool=get_serper())
+
+def make_progress_callbacks(progress_state: Dict[str, Any], total_tasks: int, crew_index: int = 0):
+    """Build Crew step/task callbacks that record progress from real agent events"""
+    # Counted per crew, so raced crews don't add up; the shared bar follows the crew furthest along
+    counts = {'steps': 0, 'tasks_done': 0}
+
+    def decided_against() -> bool:
+        # A losing crew keeps running after the race; its events must not overwrite the winner's messages
+        return progress_state.get('winner') not in (None, crew_index)
+
+    def step_callback(step):
+        if decided_against():
+            return
+        counts['steps'] += 1
+        progress_state['progress'] = max(progress_state['progress'], min(95, counts['steps'] * 5))
+
+    def task_callback(output):
+        if decided_against():
+            return
+        counts['tasks_done'] += 1
+        task_progress = min(100, round(100 * counts['tasks_done'] / total_tasks))
+        progress_state['progress'] = max(progress_state['progress'], task_progress)
+        progress_state['message'] = f"✅ {output.agent} finished"
+
+    return step_callback, task_callback
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Shared worker pool for background analysis runs, kept alive across reruns"""
+    return ThreadPoolExecutor(max_workers=4)
+
+def report_crew_duration(on_crew_done: Callable[[int, float], None], index: int, started: float, future):
+    """Done-callback passing a successful crew's duration to on_crew_done"""
+    if not future.cancelled() and future.exception() is None:
+        on_crew_done(index, round(time.time() - started, 2))
+
+async def kickoff_first_completed(crews: list, inputs: Dict[str, Any], on_crew_done: Optional[Callable[[int, float], None]] = None) -> tuple[Crew, Any]:
+    """Run crews concurrently and return the first to finish successfully, cancelling the rest"""
+    executor = ThreadPoolExecutor(max_workers=len(crews))
+    started = time.time()
+    worker_futures = [executor.submit(crew.kickoff, inputs=inputs) for crew in crews]
+    if on_crew_done is not None:
+        # Attached to the worker futures, so the losing crew still reports after this coroutine returns
+        for index, worker_future in enumerate(worker_futures):
+            worker_future.add_done_callback(functools.partial(report_crew_duration, on_crew_done, index, started))
+    futures = [asyncio.wrap_future(worker_future) for worker_future in worker_futures]
+    last_error = None
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    last_error = future.exception()
+            finished = [future for future in futures if future in done and future.exception() is None]
+            if finished:
+                # A kickoff already running in a worker cannot be interrupted; its result is discarded
+                for future in pending:
+                    future.cancel()
+                winner = finished[0]
+                return crews[futures.index(winner)], winner.result()
+        raise last_error
+    finally:
+        # Don't block on a losing kickoff; its thread exits once that crew finishes
+        executor.shutdown(wait=False)
+
+def summarize_token_usage(crew_output: Any, proposal_usage: Dict[str, int]) -> Dict[str, Any]:
+    """Token usage of one analysis for the history database
+
+    CrewAI counts crew tokens through LiteLLM's global callbacks, so the crew figures are
+    approximate whenever other crews run at the same time (async research tasks, a losing
+    speculative crew, other sessions).
+    """
+    usage = crew_output.token_usage
+    return {
+        'crew': {'prompt': usage.prompt_tokens, 'completion': usage.completion_tokens},
+        'proposal': proposal_usage,
+        # Counted locally from the analyst's final answer, which is what its max-tokens cap bounds
+        'analysis_output': litellm.token_counter(model=ANALYST_LLM_MODEL, text=crew_output.raw),
+    }
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def run_crew(company_name: str, max_tokens: int, analyst_max_tokens: int, include_competitor_analysis: bool, batch_research: bool, speculative_execution: bool, _crews: list, _proposal_llm: LLM, _progress: Dict[str, Any], _on_crew_done: Optional[Callable[[int, float], None]] = None) -> Dict[str, Any]:
+    """Run the crews and write the proposal, cached per company and settings so both always come from the same run"""
+    # Only reached on a cache miss; cache hits spent no tokens and must not be recorded again
+    _progress['executed'] = True
+    crew, result = asyncio.run(kickoff_first_completed(_crews, {'company': company_name}, _on_crew_done))
+    _progress['winner'] = _crews.index(crew)
+    # Tasks are ordered [*research_tasks, analysis_task]
+    *research_tasks, _ = crew.tasks
+    research = combine_research_findings([task.output.raw if task.output else "" for task in research_tasks])
+    analysis = str(result)
+
+    # Chunks land in the shared progress state so polling reruns show the proposal as it is written
+    _progress['message'] = "📝 Writing final proposal..."
+    proposal_usage = {'prompt': 0, 'completion': 0}
+    for chunk in stream_proposal(_proposal_llm, company_name, research, analysis, proposal_usage):
+        _progress['proposal_chunks'].append(chunk)
+    return {
+        'research': research,
+        'analysis': analysis,
+        'proposal': "".join(_progress['proposal_chunks']),
+        'tokens': summarize_token_usage(result, proposal_usage),
+    }
+
+def run_analysis(run_key: tuple, crews: list, proposal_llm: LLM, progress_state: Dict[str, Any], started: float, run_id: str, on_crew_done: Optional[Callable[[int, float], None]] = None) -> Dict[str, Any]:
+    """Background job for a single company: run the workflow and save it to history before the UI picks it up"""
+    outputs = run_crew(*run_key, crews, proposal_llm, progress_state, on_crew_done)
+    duration = time.time() - started
+    # A run_crew cache hit is not a new analysis; its ~1 s duration would skew the history stats
+    if progress_state['executed'] and not progress_state['cancelled']:
+        save_analysis_to_history(run_key[0], outputs['proposal'], duration, run_id, outputs['tokens'])
+    return {**outputs, 'duration': duration}
+
+def finish_bulk_result(company: str, crew_output: Any, proposal_llm: LLM, started: float, progress_state: Dict[str, Any]) -> Dict[str, Any]:
+    """Write the proposal for one bulk crew output and save it to history as soon as it is done"""
+    if isinstance(crew_output, Exception):
+        return {'company': company, 'error': str(crew_output)}
+    try:
+        # Task outputs are ordered [*research_outputs, analysis_output]
+        *research_outputs, _ = crew_output.tasks_output
+        research = combine_research_findings([output.raw for output in research_outputs])
+        proposal_usage = {'prompt': 0, 'completion': 0}
+        proposal = "".join(stream_proposal(proposal_llm, company, research, crew_output.raw, proposal_usage))
+        duration = time.time() - started
+        # Up to BULK_CONCURRENCY threads save at once, so a write can fail (e.g. "database is locked")
+        if not progress_state['cancelled']:
+            save_analysis_to_history(company, proposal, duration, tokens=summarize_token_usage(crew_output, proposal_usage))
+    except Exception as e:
+        return {'company': company, 'error': str(e)}
+    progress_state['message'] = f"✅ {company} saved"
+    return {'company': company, 'proposal': proposal, 'duration': duration}
+
+async def kickoff_each(crew: Crew, inputs: list[Dict[str, Any]]) -> list[Any]:
+    """Crew.kickoff_for_each_async, except a failing input returns its exception instead of failing the batch"""
+    return await asyncio.gather(*[crew.copy().kickoff_async(inputs=item) for item in inputs], return_exceptions=True)
+
+def run_bulk(crew: Crew, companies: list[str], proposal_llm: LLM, progress_state: Dict[str, Any]) -> list[Dict[str, Any]]:
+    """Run a {company}-templated crew for every company, BULK_CONCURRENCY at a time"""
+    results = []
+    for start in range(0, len(companies), BULK_CONCURRENCY):
+        if progress_state['cancelled']:
+            break
+        batch = companies[start:start + BULK_CONCURRENCY]
+        batch_start = time.time()
+        try:
+            crew_outputs = asyncio.run(kickoff_each(crew, [{'company': company} for company in batch]))
+        except Exception as e:
+            # Only this batch is lost; earlier companies are already saved and later batches still run
+            results.extend({'company': company, 'error': str(e)} for company in batch)
+            continue
+        finish = functools.partial(finish_bulk_result, proposal_llm=proposal_llm, started=batch_start, progress_state=progress_state)
+        with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as executor:
+            results.extend(executor.map(finish, batch, crew_outputs))
+    return results
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def parse_bulk_csv(data: bytes) -> list[str]:
+    """Company names from an uploaded CSV, parsed once per file content rather than on every poll rerun"""
+    bulk_df = pd.read_csv(io.BytesIO(data))
+    if 'company' not in bulk_df.columns:
+        raise ValueError("CSV must contain a 'company' column")
+    return [c.strip() for c in bulk_df['company'].dropna().astype(str) if c.strip()]
 
-    return researcher_agent, analyst_agent, proposal_agent, research_task, analysis_task, proposal_task
+def cancel_pending_run():
+    """Cancel the background analysis; a run already executing is abandoned rather than interrupted"""
+    st.session_state.pending_run['future'].cancel()
+    # An abandoned run still finishes in its worker but is no longer saved to history
+    st.session_state.pending_run['progress']['cancelled'] = True
+    st.session_state.pending_run = None
 
 def main():
     """Main application function"""
     
     # Initialize session state
     initialize_session_state()
+    history_version = init_history_db()['version']
     
     # Header
     st.markdown("""
@@ -282,166 +754,258 @@ def main():
         
         # Advanced options
         with st.expander("⚙️ Advanced Options"):
-            max_tokens = st.slider("Max Tokens per Agent", 1000, 8000, 5000, 500)
+            max_tokens = st.slider(
+                "Max Tokens per Agent", 1000, 8000, DEFAULT_MAX_TOKENS, 500,
+                key='max_tokens',
+                help="Caps the researchers and the final proposal"
+            )
+            # Seeded once per session so reruns and new history rows never reset the user's choice
+            if 'analyst_max_tokens' not in st.session_state:
+                st.session_state.analyst_max_tokens = suggest_max_tokens(load_recent_analyses(history_version))
+            analyst_max_tokens = st.slider(
+                "Max Tokens for Analyst", 1000, 8000, step=500,
+                key='analyst_max_tokens',
+                help="Defaults lower when recent analyst answers used far fewer tokens"
+            )
             verbose_output = st.checkbox("Verbose Output", value=True)
             include_competitor_analysis = st.checkbox("Include Competitor Analysis", value=True)
+            batch_research = st.checkbox(
+                "Batch Research Queries",
+                value=True,
+                help="Answer all research sub-queries in one LLM call instead of running them concurrently"
+            )
+            speculative_execution = st.checkbox(
+                "Enable Speculative Execution",
+                value=False,
+                help="Race two crews at different temperatures and keep whichever finishes first"
+            )
+            allow_parallel_tools = st.checkbox(
+                "Allow Parallel Tool Calls",
+                value=True,
+                help="Let researchers run several searches concurrently in a single tool call"
+            )
         
         # Run button with validation
         run_button = st.button(
             "🚀 Generate Proposal",
-            disabled=not (api_valid and company_name.strip()),
+            disabled=not (api_valid and company_name.strip()) or st.session_state.pending_run is not None,
             help="Generate AI/ML use case proposal" if api_valid and company_name.strip() else "Please configure API keys and enter company name"
         )
         
+        # Bulk processing from an uploaded CSV
+        bulk_file = st.file_uploader(
+            "📄 Bulk CSV",
+            type='csv',
+            help="CSV with a 'company' column; each row gets its own proposal"
+        )
+        bulk_companies = []
+        if bulk_file is not None:
+            try:
+                bulk_companies = parse_bulk_csv(bulk_file.getvalue())
+            except ValueError as e:
+                # pandas' EmptyDataError and ParserError are ValueErrors too
+                st.error(f"❌ Could not read CSV: {str(e)}")
+        
+        bulk_button = st.button(
+            f"🚀 Generate {len(bulk_companies)} Proposals" if bulk_companies else "🚀 Generate Bulk Proposals",
+            disabled=not (api_valid and bulk_companies) or st.session_state.pending_run is not None,
+            help="Process every company in the uploaded CSV"
+        )
+        
         st.markdown("---")
         
         # Analysis history
-        if st.session_state.analysis_history:
+        recent_analyses = load_recent_analyses(history_version)
+        if recent_analyses:
             st.subheader("📊 Recent Analyses")
-            for i, analysis in enumerate(reversed(st.session_state.analysis_history[-5:])):
+            for analysis in recent_analyses:
                 with st.expander(f"{analysis['company']} - {analysis['timestamp']}"):
                     st.write(f"**Duration:** {analysis['duration']}s")
                     if st.button(f"View Results", key=f"view_{analysis['id']}"):
                         st.session_state.current_analysis = analysis
+                        st.session_state.outputs = None
 
     # Main content area
     col1, col2 = st.columns([2, 1])
     
     with col2:
         # Metrics and info
-        if st.session_state.analysis_history:
+        total_analyses, avg_duration = load_history_stats(history_version)
+        if total_analyses:
             st.markdown("### 📈 Analytics")
             
-            total_analyses = len(st.session_state.analysis_history)
-            avg_duration = sum(a['duration'] for a in st.session_state.analysis_history) / total_analyses
-            
             st.metric("Total Analyses", total_analyses)
             st.metric("Avg Duration", f"{avg_duration:.1f}s")
             
-            # Create dataframe for visualization
-            if len(st.session_state.analysis_history) > 1:
-                df = pd.DataFrame(st.session_state.analysis_history)
-                st.line_chart(df.set_index('timestamp')['duration'])
+            # Chart durations and token usage from the history database
+            if total_analyses > 1:
+                st.line_chart(load_duration_history(history_version), x='timestamp', y='duration')
+                token_history = load_token_history(history_version)
+                if len(token_history) > 1:
+                    st.line_chart(token_history, x='timestamp', y=['prompt_tokens', 'completion_tokens'])
 
     with col1:
-        if run_button and company_name.strip():
+        bulk_run = bool(bulk_button and bulk_companies)
+        if (run_button and company_name.strip()) or bulk_run:
             start_time = time.time()
+            st.session_state.outputs = None
             
             try:
-                # Initialize LLM
-                llm = LLM(
-                    model="gemini/gemini-1.5-flash",
-                    verbose=verbose_output,
-                    google_api_key=os.getenv("GEMINI_API_KEY"),
-                    max_tokens=max_tokens
-                )
-
-                # Initialize tools
-                tool = SerperDevTool()
-                tool_kag = SeleniumScrapingTool()
+                # Bulk runs build one crew templated on {company}, interpolated per CSV row
+                crew_company = "{company}" if bulk_run else company_name
+                temperatures = SPECULATIVE_TEMPERATURES if speculative_execution and not bulk_run else [None]
+
+                # Reuse cached LLM and tool instances, one LLM per crew
+                llms = [get_llm(max_tokens, temperature, verbose_output) for temperature in temperatures]
+                analyst_llms = [get_llm(analyst_max_tokens, temperature, verbose_output, ANALYST_LLM_MODEL) for temperature in temperatures]
+                tool = get_serper()
+                tool_kag = get_scraper()
+                parallel_tool = get_parallel_serper() if allow_parallel_tools else None
 
                 # Create agents and tasks
-                with st.status("🤖 Initializing AI Agents...", expanded=True) as status:
-                    researcher_agent, analyst_agent, proposal_agent, research_task, analysis_task, proposal_task = create_agents_and_tasks(
-                        company_name, llm, tool, tool_kag
-                    )
-                    status.update(label="✅ Agents Initialized Successfully!", state="complete")
-
-                # Execute workflow
-                with st.status("🔄 Running AI Analysis Workflow...", expanded=True) as status:
-                    crew = Crew(
-                        agents=[researcher_agent, analyst_agent, proposal_agent],
-                        tasks=[research_task, analysis_task, proposal_task],
+                crew_parts = [
+                    create_agents_and_tasks(crew_company, llm, tool, tool_kag, batch_research, analyst_llm, parallel_tool)
+                    for llm, analyst_llm in zip(llms, analyst_llms)
+                ]
+
+                # Submit the workflow to a background worker so the script thread stays responsive
+                progress_state = {
+                    'progress': 0,
+                    'message': "🔍 Researching company and industry...",
+                    'proposal_chunks': [],
+                    'executed': False,
+                    'winner': None,
+                    'cancelled': False,
+                }
+                # Every crew runs its research tasks followed by the analysis task, once per company
+                total_tasks = (len(crew_parts[0][2]) + 1) * (len(bulk_companies) if bulk_run else 1)
+                crews = []
+                for crew_index, (researcher_agents, analyst_agent, research_tasks, analysis_task) in enumerate(crew_parts):
+                    step_callback, task_callback = make_progress_callbacks(progress_state, total_tasks, crew_index)
+                    crews.append(Crew(
+                        agents=[*researcher_agents, analyst_agent],
+                        tasks=[*research_tasks, analysis_task],
                         verbose=verbose_output,
                         max_rpm=10,
-                        share_crew=False
-                    )
-                    
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
-                    # Simulate progress updates
-                    for i in range(100):
-                        progress_bar.progress(i + 1)
-                        if i < 30:
-                            status_text.text("🔍 Researching company and industry...")
-                        elif i < 70:
-                            status_text.text("🧠 Analyzing AI/ML opportunities...")
-                        else:
-                            status_text.text("📝 Generating final proposal...")
-                        time.sleep(0.1)
-                    
-                    result = crew.kickoff(inputs={'company': company_name})
-                    status.update(label="✅ Analysis Complete!", state="complete")
-
-                end_time = time.time()
-                duration = end_time - start_time
-
-                # Save to history
-                save_analysis_to_history(company_name, str(result), duration)
-
-                # Display results
-                st.success(f"✅ Analysis completed in {duration:.2f} seconds!")
+                        share_crew=False,
+                        step_callback=step_callback,
+                        task_callback=task_callback
+                    ))
+                if bulk_run:
+                    st.session_state.pending_run = {
+                        'future': get_executor().submit(run_bulk, crews[0], bulk_companies, llms[0], progress_state),
+                        'bulk': True,
+                        'start_time': start_time,
+                        'progress': progress_state,
+                    }
+                else:
+                    run_key = (company_name, max_tokens, analyst_max_tokens, include_competitor_analysis, batch_research, speculative_execution)
+                    run_id = uuid.uuid4().hex
+                    # Record every raced crew's duration for tuning, including the loser's once it finishes
+                    on_crew_done = None
+                    if len(temperatures) > 1:
+                        on_crew_done = functools.partial(record_crew_duration, run_id, [f"t={t}" for t in temperatures])
+                    st.session_state.pending_run = {
+                        'future': get_executor().submit(run_analysis, run_key, crews, llms[0], progress_state, start_time, run_id, on_crew_done),
+                        'company': company_name,
+                        'start_time': start_time,
+                        'progress': progress_state,
+                    }
+
+            except Exception as e:
+                st.error(f"❌ An error occurred: {str(e)}")
+                st.exception(e)
+
+        pending_run = st.session_state.pending_run
+
+        if pending_run and not pending_run['future'].done():
+            # Poll the background run until it finishes
+            progress_state = pending_run['progress']
+            # A single status container carries every workflow update
+            with st.status("🔄 Running AI Analysis Workflow...", expanded=True) as status:
+                status.write("🤖 Agents initialized")
+                st.progress(progress_state['progress'])
+                st.text(progress_state['message'])
+                st.button("⏹️ Cancel Analysis", on_click=cancel_pending_run)
+            if progress_state['proposal_chunks']:
+                st.subheader(f"AI/ML Implementation Proposal for {pending_run['company']}")
+                st.markdown("".join(progress_state['proposal_chunks']))
+            time.sleep(1)
+            st.rerun()
+
+        elif pending_run and pending_run.get('bulk'):
+            st.session_state.pending_run = None
+
+            try:
+                # Each company was saved to history by the worker as it finished
+                results = pending_run['future'].result()
+                succeeded = [bulk_result for bulk_result in results if 'error' not in bulk_result]
+                failed = [bulk_result for bulk_result in results if 'error' in bulk_result]
+
+                duration = time.time() - pending_run['start_time']
+                st.success(f"✅ Generated {len(succeeded)} proposals in {duration:.2f} seconds!")
+                if failed:
+                    st.warning("⚠️ Failed: " + ", ".join(f"{r['company']} ({r['error']})" for r in failed))
+                for bulk_result in succeeded:
+                    with st.expander(f"📋 {bulk_result['company']}"):
+                        st.markdown(bulk_result['proposal'])
+
+            except Exception as e:
+                st.error(f"❌ An error occurred: {str(e)}")
+                st.exception(e)
+
+        elif pending_run:
+            st.session_state.pending_run = None
+
+            try:
+                # The worker has already written the proposal and saved it to history
+                outputs = pending_run['future'].result()
+            except Exception as e:
+                st.error(f"❌ An error occurred: {str(e)}")
+                st.exception(e)
+            else:
+                # Keep the results in the session so every later rerun renders them again
+                st.session_state.outputs = {**outputs, 'company': pending_run['company']}
+                st.rerun()
+
+        elif st.session_state.outputs:
+            outputs = st.session_state.outputs
+            company = outputs['company']
+
+            try:
+                status = st.status(f"✅ Analysis completed in {outputs['duration']:.2f} seconds!", state="complete", expanded=False)
+                status.write("🤖 Agents initialized")
+                status.write("✅ Crew finished")
+                status.write("✅ Proposal written")
                 
                 # Results tabs
                 tab1, tab2, tab3, tab4 = st.tabs(["📋 Final Proposal", "🔍 Research Findings", "📊 Use Case Analysis", "💾 Export"])
                 
                 with tab1:
-                    st.subheader(f"AI/ML Implementation Proposal for {company_name}")
-                    st.markdown(str(result))
+                    st.subheader(f"AI/ML Implementation Proposal for {company}")
+                    st.markdown(outputs['proposal'])
                 
                 with tab2:
-                    try:
-                        with open("research_findings.md", "r", encoding='utf-8') as f:
-                            st.markdown(f.read())
-                    except FileNotFoundError:
-                        st.warning("Research findings file not found")
+                    st.markdown(outputs['research'])
                 
                 with tab3:
-                    try:
-                        with open("use_case_analysis.md", "r", encoding='utf-8') as f:
-                            st.markdown(f.read())
-                    except FileNotFoundError:
-                        st.warning("Use case analysis file not found")
+                    st.markdown(outputs['analysis'])
                 
                 with tab4:
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        try:
-                            with open("final_proposal.md", "r", encoding='utf-8') as f:
-                                st.download_button(
-                                    label="📄 Download Full Proposal",
-                                    data=f.read(),
-                                    file_name=f"{company_name.replace(' ', '_')}_AI_ML_Proposal.md",
-                                    mime="text/markdown"
-                                )
-                        except FileNotFoundError:
-                            pass
-                    
-                    with col2:
-                        try:
-                            with open("research_findings.md", "r", encoding='utf-8') as f:
-                                st.download_button(
-                                    label="🔍 Download Research",
-                                    data=f.read(),
-                                    file_name=f"{company_name.replace(' ', '_')}_Research.md",
-                                    mime="text/markdown"
-                                )
-                        except FileNotFoundError:
-                            pass
-                    
-                    with col3:
-                        try:
-                            with open("use_case_analysis.md", "r", encoding='utf-8') as f:
-                                st.download_button(
-                                    label="📊 Download Analysis",
-                                    data=f.read(),
-                                    file_name=f"{company_name.replace(' ', '_')}_Analysis.md",
-                                    mime="text/markdown"
-                                )
-                        except FileNotFoundError:
-                            pass
+                    # Text is bound now and only encoded on click; downloading doesn't rerun the script
+                    for col, (key, label, suffix) in zip(st.columns(len(EXPORTS)), EXPORTS):
+                        with col:
+                            st.download_button(
+                                label=label,
+                                data=functools.partial(str.encode, outputs[key], 'utf-8'),
+                                file_name=f"{company.replace(' ', '_')}_{suffix}.md",
+                                mime="text/markdown",
+                                on_click="ignore"
+                            )
+
+                if st.button("🔄 Run New Analysis"):
+                    st.session_state.outputs = None
+                    st.rerun()
 
             except Exception as e:
                 st.error(f"❌ An error occurred: {str(e)}")